@@ -1,12 +1,26 @@
+from __future__ import annotations
+
 import os
+import sys
 import json
 import time
+import signal
 import logging
-from typing import List, Dict, Any, Tuple
-
-import requests
-import gspread
-from google.oauth2.service_account import Credentials
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import orjson
+
+# requests and the Google/gspread stack are imported lazily where first
+# needed, to keep container cold-start fast.
+if TYPE_CHECKING:
+    import gspread
+    import requests
+    from google.oauth2.service_account import Credentials
 
 # ==========================
 # Config
@@ -28,15 +42,32 @@ ALPACA_SYMBOL = os.getenv("ALPACA_SYMBOL", "RSP")
 # feed can be: "iex", "sip", or "otc"
 ALPACA_FEED = os.getenv("ALPACA_FEED", "iex")
 
+# Alpaca caps the number of bars returned per page
+ALPACA_MAX_PAGE_LIMIT = 10000
+
 # Explicit start date to ensure history is available
 ALPACA_BARS_START_DATE = os.getenv("ALPACA_BARS_START_DATE", "1990-01-01")
 
 # Moving average window
 MA_WINDOW = int(os.getenv("MA_WINDOW", "960"))  # 960-day MA
 
-# Loop interval (seconds)
+# Schedule: run once per weekday shortly after the US market close, when the
+# day's 1Day bar is final. HH:MM in America/New_York.
+MARKET_TZ = "America/New_York"
+RUN_AT_ET = os.getenv("RUN_AT_ET", "17:00")
+
+# Bars are fetched with adjustment=all, so Alpaca back-adjusts the whole
+# history on dividends/splits. The rolling window is rebuilt from a full
+# fetch at least this often, and whenever an adjustment is detected.
+MA_RESEED_DAYS = int(os.getenv("MA_RESEED_DAYS", "7"))
+
+# Retry interval (seconds) after a failed cycle, and the fallback if the next
+# scheduled run can't be computed
 REFRESH_INTERVAL_SECONDS = int(os.getenv("REFRESH_INTERVAL_SECONDS", "3600"))
 
+# Rolling MA state is persisted here so a restart doesn't refetch the window
+STATE_FILE_PATH = Path(os.getenv("STATE_FILE_PATH", "/tmp/rsp_state.json"))
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -45,18 +76,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger("rsp_ma_bot")
 
-# Google API scopes
+# Rolling MA state, persisted across run_once() cycles so each new daily bar
+# is folded in with O(1) work instead of re-summing the whole window.
+# "closes" is a fixed-size float64 ring buffer; "head" counts closes ever
+# written, so the next write goes to closes[head % MA_WINDOW]. "seeded_at"
+# is when the window was last rebuilt from a full fetch (UTC).
+_MA_STATE: Dict[str, Any] = {
+    "closes": np.empty(MA_WINDOW, dtype=np.float64),
+    "head": 0,
+    "sum": 0.0,
+    "last_t": None,
+    "seeded_at": None,
+}
+
+# Shared HTTP session, created on first use by get_session().
+_SESSION: Optional[requests.Session] = None
+
+# Credentials, gspread client, worksheet handle and spreadsheet id, reused
+# across cycles. The service-account credentials refresh their own access
+# token when it expires, so these are only rebuilt after an auth failure.
+_WS_CACHE: Dict[str, Any] = {
+    "creds": None,
+    "client": None,
+    "ws": None,
+    "spreadsheet_id": None,
+}
+
+# Last label written to the target cell; the write is skipped while the
+# classification is unchanged.
+_LAST_LABEL: Optional[str] = None
+
+# Set by the SIGTERM handler; main() exits at the next cycle boundary.
+_IN_CYCLE = False
+_STOP_REQUESTED = False
+
+# Retries for Google Sheets quota / availability errors
+SHEETS_MAX_ATTEMPTS = int(os.getenv("SHEETS_MAX_ATTEMPTS", "5"))
+SHEETS_RETRY_STATUSES = (429, 503)
+
+# Google API scopes / endpoints
+SHEETS_API_BASE_URL = "https://sheets.googleapis.com/v4"
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
 ]
 
 
+# ==========================
+# HTTP Session
+# ==========================
+
+def get_session() -> requests.Session:
+    """
+    Shared HTTP session: keeps TLS connections to Alpaca and Google alive
+    between cycles and retries transient errors with exponential backoff,
+    honoring Retry-After on 429s.
+    """
+    global _SESSION
+
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        _SESSION = requests.Session()
+        _SESSION.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=4,
+                max_retries=Retry(
+                    total=5,
+                    backoff_factor=1.0,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "PUT", "POST"]),
+                    respect_retry_after_header=True,
+                    # Hand the final response back so callers' raise_for_status()
+                    # logs its body, instead of urllib3 raising RetryError.
+                    raise_on_status=False,
+                ),
+            ),
+        )
+    return _SESSION
+
+
 # ==========================
 # Google Sheets Helpers
 # ==========================
 
-def get_gspread_client() -> gspread.Client:
+def get_service_account_credentials() -> Credentials:
+    from google.oauth2.service_account import Credentials
+
     raw_json = os.getenv(GOOGLE_SA_JSON_ENV)
     if not raw_json:
         raise RuntimeError(
@@ -64,7 +174,12 @@ def get_gspread_client() -> gspread.Client:
         )
 
     sa_info = json.loads(raw_json)
-    creds = Credentials.from_service_account_info(sa_info, scopes=SCOPES)
+    return Credentials.from_service_account_info(sa_info, scopes=SCOPES)
+
+
+def get_gspread_client(creds: Credentials) -> gspread.Client:
+    import gspread
+
     client = gspread.authorize(creds)
     logger.debug("Initialized gspread client.")
     return client
@@ -78,35 +193,113 @@ def get_dashboard_worksheet(client: gspread.Client) -> gspread.Worksheet:
     return ws
 
 
-def update_dashboard_cell(ws: gspread.Worksheet, value: str) -> None:
+def call_with_sheets_retry(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Call a gspread method, retrying on 429/503 APIErrors.
+
+    Sleeps for the response's Retry-After header when present, otherwise
+    backs off exponentially (1s, 2s, 4s, ...).
+    """
+    import gspread
+
+    for attempt in range(SHEETS_MAX_ATTEMPTS):
+        try:
+            return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            status = getattr(e.response, "status_code", None)
+            if status not in SHEETS_RETRY_STATUSES or attempt == SHEETS_MAX_ATTEMPTS - 1:
+                raise
+
+            retry_after = e.response.headers.get("Retry-After")
+            try:
+                delay = float(retry_after) if retry_after else 2 ** attempt
+            except ValueError:
+                delay = 2 ** attempt
+
+            logger.warning(
+                "Google Sheets returned %s; retrying in %.1f seconds (attempt %d/%d).",
+                status,
+                delay,
+                attempt + 1,
+                SHEETS_MAX_ATTEMPTS,
+            )
+            time.sleep(delay)
+
+
+def get_access_token(creds: Credentials) -> str:
+    """Return a valid OAuth access token, refreshing it over the shared session if needed."""
+    if not creds.valid:
+        from google.auth.transport.requests import Request as GoogleAuthRequest
+
+        creds.refresh(GoogleAuthRequest(session=get_session()))
+    return creds.token
+
+
+def update_dashboard_cell(creds: Credentials, spreadsheet_id: str, value: str) -> None:
     """
     IMPORTANT: Only update the single target cell (T3 by default).
-    Uses update_acell to avoid gspread.update signature changes.
+    Writes through the Sheets values API directly on the pooled session
+    (one PUT) instead of going through gspread.
     """
-    logger.info(
+    logger.debug(
         "Updating %s!%s with value '%s'.",
         DASHBOARD_TAB_NAME,
         TARGET_CELL,
         value,
     )
-    ws.update_acell(TARGET_CELL, value)
+
+    # A1 notation: quote the tab name and double any quotes inside it.
+    sheet_name = DASHBOARD_TAB_NAME.replace("'", "''")
+    cell_range = quote(f"'{sheet_name}'!{TARGET_CELL}", safe="")
+    resp = get_session().put(
+        f"{SHEETS_API_BASE_URL}/spreadsheets/{spreadsheet_id}/values/{cell_range}",
+        params={"valueInputOption": "RAW"},
+        headers={"Authorization": f"Bearer {get_access_token(creds)}"},
+        json={"values": [[value]]},
+        timeout=30,
+    )
+
+    try:
+        resp.raise_for_status()
+    except Exception:
+        logger.error("Error response from Google Sheets: %s", resp.text[:1000])
+        raise
 
 
 # ==========================
 # Alpaca Market Data Helpers
 # ==========================
 
+def parse_bar_time(value: str) -> np.datetime64:
+    """Alpaca RFC-3339 bar timestamp (e.g. 2024-01-02T05:00:00Z) -> datetime64[s]."""
+    return np.datetime64(value.rstrip("Z"), "s")
+
+
+def format_bar_time(value: np.datetime64) -> str:
+    """datetime64 -> RFC-3339 UTC string accepted by Alpaca's `start`/`end`."""
+    return f"{np.datetime_as_string(value, unit='s')}Z"
+
+
 def fetch_rsp_daily_bars(
     symbol: str,
     limit: int,
-) -> List[Dict[str, Any]]:
+    start: Optional[np.datetime64] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
     """
     Fetch 1Day bars for the given symbol from Alpaca's market data API.
 
-    We want the MA to be based on the most recent daily close, so:
+    Returns `(times, closes)` as chronological NumPy arrays
+    (datetime64[s] and float64); only the close is kept from each bar.
+
+    Cold run (no `start`): we want the MA to be based on the most recent
+    daily close, so:
       - We request bars sorted DESC (most recent first) from Alpaca.
       - We ask for `limit = window` bars (e.g., 960).
-      - Then we re-sort them ASC locally so the list is chronological.
+      - Then we reverse them locally so the list is chronological.
+
+    Warm run (`start` = timestamp of the last bar we already have): only
+    bars from `start` onwards are requested, capped at one per calendar
+    day, which is usually just the most recent one or two bars.
     """
     api_key = os.getenv(ALPACA_KEY_ENV)
     api_secret = os.getenv(ALPACA_SECRET_ENV)
@@ -120,123 +313,290 @@ def fetch_rsp_daily_bars(
     base_url = ALPACA_DATA_BASE_URL.rstrip("/")
     url = f"{base_url}/v2/stocks/{symbol}/bars"
 
-    params = {
-        "timeframe": "1Day",
-        "limit": limit,
-        "adjustment": "all",
-        "feed": ALPACA_FEED,               # IEX instead of SIP
-        "start": ALPACA_BARS_START_DATE,   # wide enough to cover history
-        "sort": "desc",                    # <-- MOST RECENT bars first
-    }
+    if start is None:
+        params = {
+            "timeframe": "1Day",
+            "limit": limit,
+            "adjustment": "all",
+            "feed": ALPACA_FEED,               # IEX instead of SIP
+            "start": ALPACA_BARS_START_DATE,   # wide enough to cover history
+            "sort": "desc",                    # <-- MOST RECENT bars first
+        }
+    else:
+        # At most one daily bar per calendar day since `start` can exist.
+        days_since = int((np.datetime64("today", "D") - start.astype("datetime64[D]")).astype(int))
+        params = {
+            "timeframe": "1Day",
+            "limit": max(1, days_since + 1),
+            "adjustment": "all",
+            "feed": ALPACA_FEED,
+            "start": format_bar_time(start),   # only bars since the last one we have
+            "sort": "asc",
+        }
 
-    logger.info(
-        "Requesting %d most recent daily bars for %s from Alpaca: %s with params %s",
-        limit,
+    logger.debug(
+        "Requesting daily bars for %s from Alpaca: %s with params %s",
         symbol,
         url,
         params,
     )
 
+    # Passed per request: the session is shared with Google calls, which
+    # must never see the Alpaca credentials.
     headers = {
         "APCA-API-KEY-ID": api_key,
         "APCA-API-SECRET-KEY": api_secret,
     }
 
-    resp = requests.get(url, headers=headers, params=params, timeout=30)
-    logger.debug("Alpaca response status: %s", resp.status_code)
+    session = get_session()
 
-    try:
-        resp.raise_for_status()
-    except Exception:
-        logger.error("Error response from Alpaca: %s", resp.text[:1000])
-        raise
+    # Follow next_page_token until we have `limit` bars or run out of pages;
+    # every page reuses the same pooled connection.
+    total_limit = params["limit"]
+    bars = []
+    while True:
+        params["limit"] = min(total_limit - len(bars), ALPACA_MAX_PAGE_LIMIT)
 
-    data = resp.json()
-    bars = data.get("bars", [])
+        resp = session.get(url, headers=headers, params=params, timeout=30)
+        logger.debug("Alpaca response status: %s", resp.status_code)
 
-    logger.info(
-        "Received %d bars for %s from Alpaca (feed=%s, start=%s; requested latest=%d).",
+        try:
+            resp.raise_for_status()
+        except Exception:
+            logger.error("Error response from Alpaca: %s", resp.text[:1000])
+            raise
+
+        data = orjson.loads(resp.content)
+        bars.extend(data.get("bars") or [])
+
+        page_token = data.get("next_page_token")
+        if not page_token or len(bars) >= total_limit:
+            break
+        params["page_token"] = page_token
+
+    logger.debug(
+        "Received %d bars for %s from Alpaca (feed=%s, start=%s).",
         len(bars),
         symbol,
         ALPACA_FEED,
-        ALPACA_BARS_START_DATE,
-        limit,
+        params["start"],
     )
 
     if not bars:
-        logger.warning("No bars returned for %s. Check symbol, feed, or permissions.", symbol)
-        return []
+        if start is None:
+            logger.warning("No bars returned for %s. Check symbol, feed, or permissions.", symbol)
+        return np.empty(0, dtype="datetime64[s]"), np.empty(0, dtype=np.float64)
 
-    # bars are most-recent-first from Alpaca; we want chronological.
-    bars = sorted(bars, key=lambda b: b.get("t"))
+    # Cold fetch is most-recent-first from Alpaca; we want chronological.
+    # Alpaca already returns bars in order, so a reverse is enough.
+    if params["sort"] == "desc":
+        bars.reverse()
 
     # Debug: show first and last bar plus last few closes
-    first_bar = bars[0]
-    last_bar = bars[-1]
-    logger.debug(
-        "First bar (oldest in window): t=%s o=%.4f h=%.4f l=%.4f c=%.4f v=%s",
-        first_bar.get("t"),
-        first_bar.get("o"),
-        first_bar.get("h"),
-        first_bar.get("l"),
-        first_bar.get("c"),
-        first_bar.get("v"),
-    )
-    logger.debug(
-        "Last bar (most recent in window): t=%s o=%.4f h=%.4f l=%.4f c=%.4f v=%s",
-        last_bar.get("t"),
-        last_bar.get("o"),
-        last_bar.get("h"),
-        last_bar.get("l"),
-        last_bar.get("c"),
-        last_bar.get("v"),
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        first_bar = bars[0]
+        last_bar = bars[-1]
+        assert first_bar["t"] <= last_bar["t"], "Alpaca bars are not chronological"
+
+        logger.debug(
+            "First bar (oldest in window): t=%s o=%.4f h=%.4f l=%.4f c=%.4f v=%s",
+            first_bar.get("t"),
+            first_bar.get("o"),
+            first_bar.get("h"),
+            first_bar.get("l"),
+            first_bar.get("c"),
+            first_bar.get("v"),
+        )
+        logger.debug(
+            "Last bar (most recent in window): t=%s o=%.4f h=%.4f l=%.4f c=%.4f v=%s",
+            last_bar.get("t"),
+            last_bar.get("o"),
+            last_bar.get("h"),
+            last_bar.get("l"),
+            last_bar.get("c"),
+            last_bar.get("v"),
+        )
 
-    logger.debug("Last 5 closes for %s in MA window:", symbol)
-    for b in bars[-5:]:
-        logger.debug("  t=%s c=%.4f", b.get("t"), b.get("c"))
+        logger.debug("Last 5 closes for %s in MA window:", symbol)
+        for b in bars[-5:]:
+            logger.debug("  t=%s c=%.4f", b.get("t"), b.get("c"))
 
-    return bars
+    # Strip the trailing "Z" and let NumPy parse every timestamp in one call.
+    times = np.array([b["t"][:-1] for b in bars], dtype="datetime64[s]")
+    closes = np.fromiter((b["c"] for b in bars), dtype=np.float64, count=len(bars))
+    return times, closes
 
 
 # ==========================
 # Core Logic
 # ==========================
 
-def compute_moving_average(bars: List[Dict[str, Any]], window: int) -> float:
-    if not bars:
-        raise ValueError("No bars available to compute moving average.")
+def window_size(state: Dict[str, Any]) -> int:
+    """Number of closes currently held in the ring buffer."""
+    return min(state["head"], state["closes"].size)
+
+
+def latest_close(state: Dict[str, Any]) -> float:
+    buf = state["closes"]
+    return float(buf[(state["head"] - 1) % buf.size])
+
+
+def window_closes(state: Dict[str, Any]) -> np.ndarray:
+    """The closes in the ring buffer, oldest first (a copy once it has wrapped)."""
+    buf = state["closes"]
+    head = state["head"]
+    if head <= buf.size:
+        return buf[:head]
+    split = head % buf.size
+    return np.concatenate((buf[split:], buf[:split]))
+
+
+def seed_ma_state(state: Dict[str, Any], closes: np.ndarray, last_t: np.datetime64) -> None:
+    """Replace the ring buffer contents with the last window's worth of `closes`."""
+    buf = state["closes"]
+    seed = closes[-buf.size:]
+    buf[:seed.size] = seed
+    state["head"] = seed.size
+    state["sum"] = float(seed.sum())
+    state["last_t"] = last_t
+
+
+def reset_ma_state(state: Dict[str, Any]) -> None:
+    """Forget the rolling window so the next fetch is a full (cold) one."""
+    state["head"] = 0
+    state["sum"] = 0.0
+    state["last_t"] = None
+    state["seeded_at"] = None
+
+
+def ma_state_is_stale(state: Dict[str, Any]) -> bool:
+    """True if the window hasn't been rebuilt from a full fetch in MA_RESEED_DAYS."""
+    seeded_at = state["seeded_at"]
+    if seeded_at is None:
+        return True
+    return np.datetime64("now", "s") - seeded_at >= np.timedelta64(MA_RESEED_DAYS, "D")
+
+
+def last_close_changed(state: Dict[str, Any], times: np.ndarray, closes: np.ndarray) -> bool:
+    """
+    True if a warm fetch returned the already-stored last bar with a
+    different close, i.e. Alpaca re-adjusted the history (dividend/split).
+
+    A last bar from today (New York date) is still provisional if it was
+    stored during market hours, so a changed close there is expected;
+    update_ma_state just replaces it and no refetch is needed.
+    """
+    if times.size == 0 or state["last_t"] is None or times[0] != state["last_t"]:
+        return False
+
+    # 1Day bars are stamped at midnight New York time, i.e. 04:00/05:00 UTC
+    # on the trading date, so the UTC date is the trading date.
+    today_et = np.datetime64(datetime.now(ZoneInfo(MARKET_TZ)).date(), "D")
+    if state["last_t"].astype("datetime64[D]") == today_et:
+        return False
+
+    return float(closes[0]) != latest_close(state)
+
+
+def update_ma_state(
+    state: Dict[str, Any],
+    times: np.ndarray,
+    closes: np.ndarray,
+) -> None:
+    """
+    Fold chronologically sorted bars into the rolling MA state, O(1) per bar.
+
+    - Bars older than state["last_t"] are ignored.
+    - A bar with the same timestamp as state["last_t"] replaces the most
+      recent close (today's daily bar keeps changing during market hours).
+    - Newer bars are appended; once the window is full the oldest close is
+      overwritten and subtracted from the running sum.
+
+    On a cold start the whole window is seeded in one vectorized pass.
+    """
+    if times.size == 0:
+        return
+
+    if state["last_t"] is None:
+        seed_ma_state(state, closes, times[-1])
+        state["seeded_at"] = np.datetime64("now", "s")
+        return
 
-    closes = [float(b["c"]) for b in bars if "c" in b]
+    buf = state["closes"]
+    size = buf.size
 
-    if not closes:
-        raise ValueError("No 'c' (close) values available in bars.")
+    for t, close in zip(times, closes.tolist()):
+        last_t = state["last_t"]
 
-    if len(closes) < window:
+        if t < last_t:
+            continue
+
+        if t == last_t and state["head"]:
+            idx = (state["head"] - 1) % size
+            state["sum"] += close - buf[idx]
+            buf[idx] = close
+            continue
+
+        idx = state["head"] % size
+        if state["head"] >= size:
+            state["sum"] -= buf[idx]
+        buf[idx] = close
+        state["head"] += 1
+        state["sum"] += close
+        state["last_t"] = t
+
+
+def rolling_means(closes: np.ndarray, window: int) -> np.ndarray:
+    """
+    All `window`-bar simple moving averages over `closes`, in O(n).
+
+    Uses cumulative-sum differencing (equivalent to convolving with a
+    uniform kernel); the last element is the MA ending at the latest close.
+    Handy for computing several MA lengths (50/200/960) off one series.
+    """
+    if window <= 0 or window > closes.size:
+        raise ValueError(
+            f"Window {window} is out of range for {closes.size} closes."
+        )
+
+    csum = np.empty(closes.size + 1, dtype=np.float64)
+    csum[0] = 0.0
+    np.cumsum(closes, out=csum[1:])
+    return (csum[window:] - csum[:-window]) / window
+
+
+def compute_moving_average(state: Dict[str, Any]) -> float:
+    """MA over every close in the ring buffer (the last MA_WINDOW bars once full)."""
+    window = window_size(state)
+
+    if not window:
+        raise ValueError("No 'c' (close) values available to compute moving average.")
+
+    if window < state["closes"].size:
         logger.warning(
             "Only %d closes available; requested window is %d. "
             "Will compute MA over available closes.",
-            len(closes),
             window,
+            state["closes"].size,
         )
-        window = len(closes)
 
-    # Take the last `window` closes — this is the 960-bar lookback ending at the most recent bar.
-    relevant = closes[-window:]
-    ma_value = sum(relevant) / window
+    # The running sum covers exactly the closes held in the ring buffer.
+    ma_value = state["sum"] / window
 
-    logger.info(
+    logger.debug(
         "Computed %d-bar MA for %s closes (ending at most recent bar): MA=%.4f",
         window,
         ALPACA_SYMBOL,
         ma_value,
     )
-    logger.debug(
-        "MA window debug: first_close=%.4f last_close=%.4f sample_count=%d",
-        relevant[0],
-        relevant[-1],
-        len(relevant),
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        closes = window_closes(state)
+        logger.debug(
+            "MA window debug: first_close=%.4f last_close=%.4f sample_count=%d",
+            closes[0],
+            closes[-1],
+            closes.size,
+        )
     return ma_value
 
 
@@ -259,7 +619,7 @@ def classify_trend(last_price: float, ma_value: float) -> Tuple[str, float]:
     else:
         label = "STRONG"
 
-    logger.info(
+    logger.debug(
         "Classification for %s: last_price=%.4f, MA=%.4f, diff=%.2f%% => %s",
         ALPACA_SYMBOL,
         last_price,
@@ -274,31 +634,73 @@ def classify_trend(last_price: float, ma_value: float) -> Tuple[str, float]:
 def run_once() -> None:
     """
     Single full cycle:
-    - Fetch the LATEST 960 bars from Alpaca (IEX feed) for RSP
-    - Compute MA over those 960 closes (lookback from most recent bar)
+    - Fetch the LATEST 960 bars from Alpaca (IEX feed) for RSP on the first
+      run, then only the bars since the last one seen on later runs (with a
+      full refetch weekly or when the adjusted history changes)
+    - Roll those closes into the 960-bar MA (lookback from most recent bar)
     - Classify as WEAK/MODERATE/STRONG
     - Update Dashboard!T3
     """
-    logger.info("Starting RSP MA update cycle (Alpaca IEX feed)...")
+    global _LAST_LABEL
+
+    logger.debug("Starting RSP MA update cycle (Alpaca IEX feed)...")
+
+    # 1) Google Sheets setup (cached across cycles)
+    if _WS_CACHE["ws"] is None:
+        _WS_CACHE["creds"] = get_service_account_credentials()
+        _WS_CACHE["client"] = get_gspread_client(_WS_CACHE["creds"])
+        _WS_CACHE["ws"] = get_dashboard_worksheet(_WS_CACHE["client"])
+        _WS_CACHE["spreadsheet_id"] = _WS_CACHE["ws"].spreadsheet.id
+
+        # Seed the last label once per process so a restart doesn't
+        # rewrite an unchanged value.
+        if _LAST_LABEL is None:
+            try:
+                _LAST_LABEL = call_with_sheets_retry(
+                    _WS_CACHE["ws"].acell, TARGET_CELL
+                ).value
+            except Exception as e:
+                logger.warning(
+                    "Could not read current value from %s!%s: %s",
+                    DASHBOARD_TAB_NAME,
+                    TARGET_CELL,
+                    e,
+                )
+
+    # 2) Fetch daily bars (latest N on a cold start, otherwise only new ones)
+    if _MA_STATE["last_t"] is not None and ma_state_is_stale(_MA_STATE):
+        logger.debug("Rolling window older than %d days; doing a full fetch.", MA_RESEED_DAYS)
+        reset_ma_state(_MA_STATE)
+
+    times, closes = fetch_rsp_daily_bars(
+        ALPACA_SYMBOL,
+        limit=MA_WINDOW,
+        start=_MA_STATE["last_t"],
+    )
 
-    # 1) Google Sheets setup
-    client = get_gspread_client()
-    ws = get_dashboard_worksheet(client)
+    # A changed close on an already-final last bar means the adjusted
+    # history moved under us; only a full refetch keeps the window consistent.
+    if last_close_changed(_MA_STATE, times, closes):
+        logger.info(
+            "Stored close for %s bar %s changed (adjusted history moved); refetching full window.",
+            ALPACA_SYMBOL,
+            _MA_STATE["last_t"],
+        )
+        reset_ma_state(_MA_STATE)
+        times, closes = fetch_rsp_daily_bars(ALPACA_SYMBOL, limit=MA_WINDOW)
 
-    # 2) Fetch daily bars (latest N)
-    bars = fetch_rsp_daily_bars(ALPACA_SYMBOL, limit=MA_WINDOW)
+    update_ma_state(_MA_STATE, times, closes)
 
-    if not bars:
+    if not window_size(_MA_STATE):
         logger.error("No bars returned for %s; skipping sheet update.", ALPACA_SYMBOL)
         return
 
     # 3) Compute MA and current price
-    ma_value = compute_moving_average(bars, MA_WINDOW)
-    last_bar = bars[-1]  # because we sorted ascending; this is the most recent bar
-    last_price = float(last_bar["c"])
-    last_time = last_bar.get("t")
+    ma_value = compute_moving_average(_MA_STATE)
+    last_price = latest_close(_MA_STATE)  # most recent close in the window
+    last_time = _MA_STATE["last_t"]
 
-    logger.info(
+    logger.debug(
         "Latest %s bar: t=%s close=%.4f (used as the end of the 960-bar MA window).",
         ALPACA_SYMBOL,
         last_time,
@@ -308,59 +710,242 @@ def run_once() -> None:
     # 4) Classify trend
     label, diff_pct = classify_trend(last_price, ma_value)
 
-    # 5) Update ONLY T3
-    try:
-        previous_value = ws.acell(TARGET_CELL).value
-    except Exception as e:
-        logger.warning(
-            "Could not read previous value from %s!%s: %s",
+    # 5) Update ONLY T3, and only when the label actually changed
+    if label == _LAST_LABEL:
+        logger.debug(
+            "Label unchanged (%s); skipping write to %s!%s.",
+            label,
             DASHBOARD_TAB_NAME,
             TARGET_CELL,
-            e,
         )
-        previous_value = None
+        written = False
+    else:
+        from requests import HTTPError
 
+        try:
+            update_dashboard_cell(_WS_CACHE["creds"], _WS_CACHE["spreadsheet_id"], label)
+        except HTTPError as e:
+            if getattr(e.response, "status_code", None) == 401:
+                logger.warning("Google Sheets auth failed; will re-authorize next cycle.")
+                for key in _WS_CACHE:
+                    _WS_CACHE[key] = None
+            raise
+
+        _LAST_LABEL = label
+        written = True
+
+    # One INFO summary per cycle; the per-step detail above is at DEBUG.
     logger.info(
-        "Previous value in %s!%s was: %s",
+        "Finished cycle. %s close=%.4f MA=%.4f diff=%.2f%% => %s (%s!%s %s).",
+        ALPACA_SYMBOL,
+        last_price,
+        ma_value,
+        diff_pct,
+        label,
         DASHBOARD_TAB_NAME,
         TARGET_CELL,
-        previous_value,
+        "updated" if written else "unchanged",
     )
 
-    update_dashboard_cell(ws, label)
+
+def _window_state_key() -> List[Any]:
+    """Config the saved MA window depends on."""
+    return [ALPACA_SYMBOL, ALPACA_FEED, MA_WINDOW]
+
+
+def _cell_state_key() -> List[Any]:
+    """Config the saved last label depends on."""
+    return [SHEET_NAME, DASHBOARD_TAB_NAME, TARGET_CELL]
+
+
+def load_state() -> None:
+    """
+    Restore the rolling MA window and last label from STATE_FILE_PATH.
+
+    A missing, unreadable, or malformed state file is ignored and the next
+    cycle does a normal cold fetch. The window is also ignored if it was
+    saved for a different symbol/feed/window or seeded more than
+    MA_RESEED_DAYS ago, and the label if it was written to a different
+    sheet/tab/cell (so the one-time cell read runs instead).
+    """
+    global _LAST_LABEL
+
+    try:
+        saved = orjson.loads(STATE_FILE_PATH.read_bytes())
+
+        # The label only means something for the cell it was written to.
+        last_label = None
+        if saved.get("cell_key") == _cell_state_key():
+            last_label = saved.get("last_label")
+        else:
+            logger.info("Saved label at %s is for a different sheet/tab/cell; ignoring it.", STATE_FILE_PATH)
+
+        if saved.get("window_key") != _window_state_key() or not saved.get("closes") or not saved.get("last_t"):
+            logger.info(
+                "Saved window at %s doesn't match symbol=%s feed=%s window=%d; ignoring.",
+                STATE_FILE_PATH,
+                ALPACA_SYMBOL,
+                ALPACA_FEED,
+                MA_WINDOW,
+            )
+            _LAST_LABEL = last_label
+            return
+
+        if not saved.get("seeded_at"):
+            logger.info("Saved state at %s has no seed time; starting cold.", STATE_FILE_PATH)
+            _LAST_LABEL = last_label
+            return
+
+        seed_ma_state(
+            _MA_STATE,
+            np.asarray(saved["closes"], dtype=np.float64),
+            parse_bar_time(saved["last_t"]),
+        )
+        _MA_STATE["seeded_at"] = parse_bar_time(saved["seeded_at"])
+    except FileNotFoundError:
+        logger.info("No saved state at %s; starting cold.", STATE_FILE_PATH)
+        return
+    except Exception as e:
+        logger.warning("Could not restore saved state from %s: %s", STATE_FILE_PATH, e)
+        reset_ma_state(_MA_STATE)
+        _LAST_LABEL = None
+        return
+
+    _LAST_LABEL = last_label
+
+    if ma_state_is_stale(_MA_STATE):
+        logger.info(
+            "Saved window at %s was seeded at %s (over %d days ago); starting cold.",
+            STATE_FILE_PATH,
+            saved["seeded_at"],
+            MA_RESEED_DAYS,
+        )
+        reset_ma_state(_MA_STATE)
+        return
 
     logger.info(
-        "Finished cycle. Dashboard!%s is now '%s' (diff vs MA: %.2f%%).",
-        TARGET_CELL,
-        label,
-        diff_pct,
+        "Restored %d closes (last bar %s) from %s.",
+        window_size(_MA_STATE),
+        saved["last_t"],
+        STATE_FILE_PATH,
     )
 
 
+def save_state() -> None:
+    """Atomically write the rolling MA window and last label to STATE_FILE_PATH."""
+    if _MA_STATE["last_t"] is None:
+        return
+
+    payload = {
+        "window_key": _window_state_key(),
+        "cell_key": _cell_state_key(),
+        "closes": window_closes(_MA_STATE).tolist(),
+        "last_t": format_bar_time(_MA_STATE["last_t"]),
+        "seeded_at": format_bar_time(_MA_STATE["seeded_at"]),
+        "last_label": _LAST_LABEL,
+    }
+
+    try:
+        tmp_path = STATE_FILE_PATH.with_name(STATE_FILE_PATH.name + ".tmp")
+        tmp_path.write_bytes(orjson.dumps(payload))
+        os.replace(tmp_path, STATE_FILE_PATH)
+    except Exception as e:
+        logger.warning("Could not save state to %s: %s", STATE_FILE_PATH, e)
+
+
+def handle_sigterm(signum: int, frame: Any) -> None:
+    """
+    Stop at a cycle boundary so the state is never snapshotted mid-update.
+
+    While sleeping between cycles the state was already saved, so exit
+    right away; during a cycle just flag the stop and let main() save and
+    exit once run_once() returns.
+    """
+    global _STOP_REQUESTED
+
+    _STOP_REQUESTED = True
+    if not _IN_CYCLE:
+        logger.info("Received signal %d; exiting.", signum)
+        sys.exit(0)
+    logger.info("Received signal %d; exiting after the current cycle.", signum)
+
+
+def seconds_until_next_run(now: Optional[datetime] = None) -> float:
+    """
+    Seconds from `now` until the next weekday RUN_AT_ET in New York time.
+
+    Weekends are skipped. Market holidays are not; on those days the run
+    simply finds no new bar and leaves the sheet alone.
+    """
+    tz = ZoneInfo(MARKET_TZ)
+    now_utc = now or datetime.now(timezone.utc)
+    now_et = now_utc.astimezone(tz)
+
+    hour, minute = (int(part) for part in RUN_AT_ET.split(":"))
+    next_run = now_et.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now_et:
+        next_run += timedelta(days=1)
+    while next_run.weekday() >= 5:  # Saturday / Sunday
+        next_run += timedelta(days=1)
+
+    # Subtract in UTC so DST transitions are accounted for.
+    return (next_run.astimezone(timezone.utc) - now_utc).total_seconds()
+
+
 def main() -> None:
+    global _IN_CYCLE
+
     logger.info(
         "RSP MA bot starting (Alpaca IEX feed). "
-        "Sheet='%s', tab='%s', cell='%s', interval=%ss, feed=%s, start=%s, window=%d",
+        "Sheet='%s', tab='%s', cell='%s', run_at=%s ET, feed=%s, start=%s, window=%d",
         SHEET_NAME,
         DASHBOARD_TAB_NAME,
         TARGET_CELL,
-        REFRESH_INTERVAL_SECONDS,
+        RUN_AT_ET,
         ALPACA_FEED,
         ALPACA_BARS_START_DATE,
         MA_WINDOW,
     )
 
+    load_state()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
     while True:
+        _IN_CYCLE = True
         try:
             run_once()
+            save_state()
+            succeeded = True
         except Exception as e:
             logger.exception("Unexpected error during update cycle: %s", e)
+            succeeded = False
+        finally:
+            _IN_CYCLE = False
+
+        if _STOP_REQUESTED:
+            logger.info("Stopping after signal.")
+            return
+
+        try:
+            sleep_seconds = seconds_until_next_run()
+        except Exception as e:
+            logger.warning(
+                "Could not compute next scheduled run (%s); falling back to %d seconds.",
+                e,
+                REFRESH_INTERVAL_SECONDS,
+            )
+            sleep_seconds = REFRESH_INTERVAL_SECONDS
+
+        # Don't leave the cell stale until the next scheduled run (possibly
+        # after a weekend) because of one transient failure.
+        if not succeeded:
+            sleep_seconds = min(sleep_seconds, REFRESH_INTERVAL_SECONDS)
 
         logger.info(
             "Sleeping for %d seconds before next run...",
-            REFRESH_INTERVAL_SECONDS,
+            sleep_seconds,
         )
-        time.sleep(REFRESH_INTERVAL_SECONDS)
+        time.sleep(sleep_seconds)
 
 
 if __name__ == "__main__":